@@ -1,11 +1,23 @@
 import os
 import uuid
 import shutil
+import stat
+import time
 import asyncio
+import multiprocessing
+import functools
+import zipfile
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from types import MappingProxyType
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+import anyio
+import orjson
 import yt_dlp
 
 app = FastAPI()
@@ -18,10 +30,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DOWNLOAD_DIR = "temp_downloads"
+DOWNLOAD_DIR = Path("temp_downloads")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 FFMPEG_PATH = r'C:\ffmpeg\bin\ffmpeg.exe'
 
+class WorkerPool(Executor):
+    # ProcessPoolExecutor that replaces itself once broken. If a worker process dies
+    # (OOM killer, crash in a native extension) the executor is marked broken for good
+    # and every later submit would raise BrokenProcessPool until a server restart.
+    # Workers are spawned, not forked: a forked worker would inherit uvicorn's
+    # listening and client sockets (holding connections open and the port bound
+    # after shutdown) along with the state of its other threads.
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = self.new_executor()
+
+    def new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        try:
+            return self.executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # Jobs that were running when it broke have already failed with it
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self.new_executor()
+            return self.executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+# yt-dlp runs in worker processes so extractor parsing isn't serialized on the GIL.
+# Info lookups get their own pool so they stay fast while downloads/ffmpeg are busy.
+CPU_COUNT = os.cpu_count() or 1
+INFO_POOL = WorkerPool(max_workers=CPU_COUNT)
+DOWNLOAD_POOL = WorkerPool(max_workers=max(2, CPU_COUNT // 2))
+# Run-folder removal gets its own threads so a slow rmtree of a big batch can't
+# hold up the default executor the ZIP streaming reads go through
+CLEANUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cleanup')
+# Cap simultaneous downloads so concurrent requests don't split the bandwidth too thin
+MAX_CONCURRENT_DOWNLOADS = 4
+DOWNLOAD_SLOTS = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+# Items of one batch waiting on DOWNLOAD_SLOTS at a time; kept below the global cap so
+# a big batch can't line up all its URLs ahead of later single downloads
+MAX_BATCH_PARALLEL = 3
+
+# What /api/info and /api/channel-info use of each extract_info result, keyed by
+# worker + URL + options. Whole info dicts run to megabytes for big channels.
+INFO_CACHE_TTL = 300  # seconds
+INFO_CACHE_SIZE = 1024
+INFO_CACHE: dict[tuple, tuple[float, tuple]] = {}
+INFO_PENDING: dict[tuple, asyncio.Task] = {}
+# Share/timestamp query params that don't change what extract_info returns
+IGNORED_QUERY_PARAMS = {'t', 'si', 'feature', 'pp'}
+
+# Identical (url, is_audio, quality) downloads in flight share one yt-dlp run
+DOWNLOADS_PENDING: dict[tuple, "SharedDownload"] = {}
+# Strong references to fire-and-forget tasks; the event loop only keeps weak ones
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+# /api/channel-info streams its video list this many entries at a time
+CHANNEL_CHUNK_SIZE = 500
+
+# Largest number of URLs accepted in one batch request
+MAX_BATCH_SIZE = 50
+
+# Batch files are copied into the streamed ZIP in chunks of this size
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+# yt-dlp option templates; each download overlays only outtmpl, format and quality
+AUDIO_OPTS_BASE = MappingProxyType({
+    'quiet': True,
+    'no_warnings': True,
+    'ffmpeg_location': FFMPEG_PATH,
+})
+VIDEO_OPTS_BASE = MappingProxyType({
+    'quiet': True,
+    'no_warnings': True,
+    'ffmpeg_location': FFMPEG_PATH,
+    'merge_output_format': 'mp4',
+})
+MP3_POSTPROCESSOR = MappingProxyType({
+    'key': 'FFmpegExtractAudio',
+    'preferredcodec': 'mp3',
+})
+
 # The exact quality text mapping you requested
 QUALITY_MAP = {
     2160: "2160p (4K): 256–512 kbps",
@@ -39,34 +132,166 @@ class BatchRequest(BaseModel):
     type: str     # 'audio' or 'video'
     quality: str  # e.g., '1080', '720', or '192'
 
-def cleanup_file(filepath: str):
+class SharedDownload:
+    # One yt-dlp run, its run folder, and the number of responses still serving its file
+    def __init__(self, task: asyncio.Task, root: Path):
+        self.task = task
+        self.root = root
+        self.refs = 0
+
+class ClosingStreamingResponse(StreamingResponse):
+    # StreamingResponse leaves its body iterator suspended when the client goes away
+    # mid-send; close it here so the generator's cleanup runs right away instead of
+    # whenever (if ever) the garbage collector finalizes it
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+class ZipChunkWriter:
+    # Write-only sink for zipfile. With no tell()/seek(), zipfile writes data
+    # descriptors after each entry, so the archive can be streamed as it's built.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def cleanup_file(filepath: str | Path):
     try:
-        if os.path.isfile(filepath): os.remove(filepath)
-        elif os.path.isdir(filepath): shutil.rmtree(filepath)
+        # One lstat decides file vs dir; a path that's already gone is a no-op
+        st = os.lstat(filepath)
+        if stat.S_ISDIR(st.st_mode): shutil.rmtree(filepath)
+        else: os.remove(filepath)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         print(f"Error cleaning up {filepath}: {e}")
 
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+async def cleanup_async(filepath: str | Path):
+    await asyncio.get_running_loop().run_in_executor(CLEANUP_POOL, cleanup_file, filepath)
+
+# Worker functions below run inside the process pools, so they must stay at module level
+# (picklable) and only take and return plain data.
+def pool_worker(fn):
+    # DownloadError keeps the original exc_info (with its traceback), which can't be
+    # pickled back to the parent; re-raise it with just the message.
+    @functools.wraps(fn)
+    def wrapper(*args):
+        try:
+            return fn(*args)
+        except yt_dlp.utils.DownloadError as e:
+            raise yt_dlp.utils.DownloadError(str(e)) from None
+    return wrapper
+
+@functools.lru_cache(maxsize=16)
+def cached_ydl(opts_key: tuple) -> yt_dlp.YoutubeDL:
+    # Building a YoutubeDL (extractor registry, HTTP director) costs ~80ms, so each
+    # worker process keeps one per option set. Workers run one job at a time, so
+    # no locking is needed.
+    return yt_dlp.YoutubeDL(dict(opts_key))
+
+def extract_info(url: str, ydl_opts: dict) -> dict:
+    return cached_ydl(tuple(sorted(ydl_opts.items()))).extract_info(url, download=False)
+
+# The info workers reduce the info dict to what their endpoint reads before it
+# is pickled back, so only that crosses the process boundary and sits in INFO_CACHE
+
+@pool_worker
+def fetch_video_heights(url: str, ydl_opts: dict) -> tuple[int, ...]:
+    info = extract_info(url, ydl_opts)
+    # Unique video heights available for this specific video, only keeping
+    # standard heights we have mapped, in descending order
+    return tuple(sorted({f['height'] for f in info.get('formats', []) if f.get('vcodec') != 'none' and f.get('height') in QUALITY_MAP}, reverse=True))
+
+@pool_worker
+def fetch_channel_videos(url: str, ydl_opts: dict) -> tuple[str, tuple[tuple[str, str], ...]]:
+    info = extract_info(url, ydl_opts)
+    videos = []
+    for e in info.get('entries', []):
+        vid_url = e.get('url')
+        if not vid_url and e.get('id'): vid_url = f"https://www.youtube.com/watch?v={e.get('id')}"
+        if vid_url: videos.append((e.get('title', 'Unknown Title'), vid_url))
+    return info.get('title', 'Channel'), tuple(videos)
+
+@pool_worker
+def run_ytdlp(url: str, ydl_opts: dict, is_audio: bool) -> tuple[str, os.stat_result]:
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        filename = ydl.prepare_filename(info)
+    # FFmpegExtractAudio swaps the extension after the download finishes
+    if is_audio: filename = os.path.splitext(filename)[0] + ".mp3"
+    # Stat here, once per download, and hand it to FileResponse so it doesn't
+    # stat the file again for every response
+    return filename, os.stat(filename)
+
+@pool_worker
+def run_batch(urls: list[str], ydl_opts: dict) -> list[str]:
+    # post_hooks fire with each file's final path once postprocessing is done,
+    # so partial/intermediate files left in the batch dir never end up in the ZIP
+    filenames = []
+    ydl_opts = {**ydl_opts, 'post_hooks': [filenames.append]}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download(urls)
+    return filenames
+
+def copy_chunk(src, dst) -> int:
+    chunk = src.read(ZIP_CHUNK_SIZE)
+    dst.write(chunk)
+    return len(chunk)
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_QUERY_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query), fragment=''))
+
+async def cached_fetch_info(fetch_fn, url: str, ydl_opts: dict) -> tuple:
+    url = normalize_url(url)
+    key = (fetch_fn.__name__, url, tuple(sorted(ydl_opts.items())))
+    hit = INFO_CACHE.get(key)
+    if hit and hit[0] > time.monotonic(): return hit[1]
+
+    # Concurrent lookups of the same URL share a single extract_info call
+    task = INFO_PENDING.get(key)
+    if task is None:
+        async def fetch():
+            info = await asyncio.get_running_loop().run_in_executor(INFO_POOL, fetch_fn, url, ydl_opts)
+            INFO_CACHE.pop(key, None)
+            if len(INFO_CACHE) >= INFO_CACHE_SIZE: INFO_CACHE.pop(next(iter(INFO_CACHE)))
+            INFO_CACHE[key] = (time.monotonic() + INFO_CACHE_TTL, info)
+            return info
+        task = INFO_PENDING[key] = asyncio.create_task(fetch())
+        task.add_done_callback(lambda _: INFO_PENDING.pop(key, None))
+    return await asyncio.shield(task)
+
+async def cached_video_heights(url: str) -> tuple[int, ...]:
+    # /api/info and download_video share these options so they share cache entries
+    return await cached_fetch_info(fetch_video_heights, url, {'quiet': True, 'ffmpeg_location': FFMPEG_PATH})
+
 # NEW ENDPOINT: Fetch specific available qualities for a single video
 @app.get("/api/info")
 async def get_video_info(url: str):
-    ydl_opts = {'quiet': True, 'ffmpeg_location': FFMPEG_PATH}
-    def fetch():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            return ydl.extract_info(url, download=False)
-            
     try:
-        info = await asyncio.to_thread(fetch)
-        
-        # Extract unique video heights available for this specific video
-        available_heights = set()
-        for f in info.get('formats', []):
-            if f.get('vcodec') != 'none' and f.get('height'):
-                # Only keep standard heights we have mapped
-                if f.get('height') in QUALITY_MAP:
-                    available_heights.add(f.get('height'))
+        available_heights = await cached_video_heights(url)
                     
-        # Sort descending and take the top 5 maximum available
-        sorted_heights = sorted(list(available_heights), reverse=True)[:5]
+        # Take the top 5 maximum available; the cached tuple is already sorted
+        sorted_heights = available_heights[:5]
         
         # Format for the frontend
         video_options = [{"value": h, "label": QUALITY_MAP[h]} for h in sorted_heights]
@@ -87,63 +312,111 @@ async def get_video_info(url: str):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-async def download_media(url: str, is_audio: bool, quality: str) -> str:
-    run_id = str(uuid.uuid4())
-    output_template = f"{DOWNLOAD_DIR}/{run_id}/%(title)s.%(ext)s"
-    
-    ydl_opts = {
-        'outtmpl': output_template,
-        'quiet': True,
-        'no_warnings': True,
-        'ffmpeg_location': FFMPEG_PATH,
-    }
+async def run_download(url: str, is_audio: bool, quality: str | None, root: Path) -> tuple[str, os.stat_result]:
+    output_template = str(root / "%(title)s.%(ext)s")
 
     if is_audio:
         # Request audio with bitrate <= requested quality, fallback to best available
-        ydl_opts.update({
+        ydl_opts = {
+            **AUDIO_OPTS_BASE,
+            'outtmpl': output_template,
             'format': f'bestaudio[abr<={quality}]/bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': quality,
-            }],
-        })
+            'postprocessors': [{**MP3_POSTPROCESSOR, 'preferredquality': quality}],
+        }
+    elif not quality:
+        # No height limit: keep the source streams as-is. MKV takes any codec pair
+        # (VP9/AV1 + Opus included), so the merge is always a plain remux.
+        ydl_opts = {
+            **VIDEO_OPTS_BASE,
+            'outtmpl': output_template,
+            'format': 'bestvideo+bestaudio/best',
+            'merge_output_format': 'mkv',
+        }
     else:
-        # Request video height <= requested quality, fallback to best available
-        ydl_opts.update({
+        # Request video height <= requested quality, fallback to best available.
+        # The height cap is applied when picking formats, so yt-dlp's merger only
+        # remuxes (-c copy) and ffmpeg never re-encodes video on this path.
+        ydl_opts = {
+            **VIDEO_OPTS_BASE,
+            'outtmpl': output_template,
             'format': f'bestvideo[height<={quality}]+bestaudio/best',
-            'merge_output_format': 'mp4',
-        })
+        }
 
-    def run_ytdlp():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-            
-    await asyncio.to_thread(run_ytdlp)
-    
-    folder_path = f"{DOWNLOAD_DIR}/{run_id}"
-    downloaded_files = os.listdir(folder_path)
-    if not downloaded_files: raise HTTPException(status_code=500, detail="Download failed.")
-    return os.path.join(folder_path, downloaded_files[0])
+    async with DOWNLOAD_SLOTS:
+        return await asyncio.get_running_loop().run_in_executor(DOWNLOAD_POOL, run_ytdlp, url, ydl_opts, is_audio)
+
+async def download_media(url: str, is_audio: bool, quality: str | None) -> tuple[str, os.stat_result, SharedDownload]:
+    key = (url, is_audio, quality)
+    shared = DOWNLOADS_PENDING.get(key)
+    if shared is None:
+        root = DOWNLOAD_DIR / uuid.uuid4().hex[:16]
+        shared = DOWNLOADS_PENDING[key] = SharedDownload(asyncio.create_task(run_download(url, is_audio, quality, root)), root)
+        shared.task.add_done_callback(lambda _: DOWNLOADS_PENDING.pop(key, None))
+
+    shared.refs += 1
+    try:
+        filepath, st = await asyncio.shield(shared.task)
+        return filepath, st, shared
+    except BaseException:
+        # This request won't stream the file; hand its reference back right away
+        run_in_background(release_download(shared))
+        raise
+
+async def release_download(shared: SharedDownload):
+    # The last response out removes the run folder, once yt-dlp is done writing to it
+    shared.refs -= 1
+    if shared.refs: return
+    try:
+        await shared.task
+    except Exception:
+        pass
+    # Another request may have joined while the download was still running
+    if shared.refs: return
+    await cleanup_async(shared.root)
+
+async def is_native_max(url: str, quality: str) -> bool:
+    # The frontend always sends a quality, and its top option is the video's best
+    # height. Capping there changes nothing about the picked streams, so the download
+    # takes the uncapped MKV path instead of forcing an mp4 merge. The lookup is
+    # normally a cache hit from the /api/info call that built the menu.
+    try:
+        heights = await cached_video_heights(url)
+        return bool(heights) and int(quality) >= heights[0]
+    except Exception:
+        # No height info to compare against: keep the requested cap
+        return False
 
 @app.get("/api/download/audio")
 async def download_audio(url: str, quality: str, background_tasks: BackgroundTasks):
     try:
-        filepath = await download_media(url, is_audio=True, quality=quality)
-        background_tasks.add_task(cleanup_file, os.path.dirname(filepath)) 
-        return FileResponse(path=filepath, filename=os.path.basename(filepath), media_type='audio/mpeg')
+        filepath, st, shared = await download_media(url, is_audio=True, quality=quality)
+        background_tasks.add_task(release_download, shared) 
+        return FileResponse(path=filepath, filename=os.path.basename(filepath), media_type='audio/mpeg', stat_result=st)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/download/video")
-async def download_video(url: str, quality: str, background_tasks: BackgroundTasks):
+async def download_video(url: str, background_tasks: BackgroundTasks, quality: str | None = None):
     try:
-        filepath = await download_media(url, is_audio=False, quality=quality)
-        background_tasks.add_task(cleanup_file, os.path.dirname(filepath))
-        return FileResponse(path=filepath, filename=os.path.basename(filepath), media_type='video/mp4')
+        if quality and await is_native_max(url, quality): quality = None
+        filepath, st, shared = await download_media(url, is_audio=False, quality=quality)
+        background_tasks.add_task(release_download, shared)
+        media_type = 'video/x-matroska' if filepath.endswith('.mkv') else 'video/mp4'
+        return FileResponse(path=filepath, filename=os.path.basename(filepath), media_type=media_type, stat_result=st)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def stream_channel_info(channel_name: str, videos: tuple[tuple[str, str], ...]):
+    # Emits the same JSON document the endpoint always returned, a slice of the
+    # video list at a time, so large channels are serialized off the event loop
+    # and the first bytes go out before the whole list is encoded
+    yield b'{"status":"success","channel_name":' + orjson.dumps(channel_name) + b',"videos":['
+    for i in range(0, len(videos), CHANNEL_CHUNK_SIZE):
+        chunk = [{'title': title, 'url': vid_url} for title, vid_url in videos[i:i + CHANNEL_CHUNK_SIZE]]
+        # orjson encodes a whole slice in one C call; strip its [] to splice it in
+        yield (b',' if i else b'') + orjson.dumps(chunk)[1:-1]
+    yield b']}'
+
 @app.get("/api/channel-info")
 async def get_channel_info(url: str):
     if "@" in url and "youtube.com" in url:
@@ -151,54 +424,125 @@ async def get_channel_info(url: str):
             url = url.split("?")[0] + "/videos"
 
     ydl_opts = {'extract_flat': True, 'quiet': True, 'ffmpeg_location': FFMPEG_PATH}
-    def fetch_info():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            return ydl.extract_info(url, download=False)
             
     try:
-        info = await asyncio.to_thread(fetch_info)
-        videos = []
-        for e in info.get('entries', []):
-            vid_url = e.get('url')
-            if not vid_url and e.get('id'): vid_url = f"https://www.youtube.com/watch?v={e.get('id')}"
-            if vid_url: videos.append({'title': e.get('title', 'Unknown Title'), 'url': vid_url})
-        return {"status": "success", "channel_name": info.get('title', 'Channel'), "videos": videos}
+        channel_name, videos = await cached_fetch_info(fetch_channel_videos, url, ydl_opts)
+        # StreamingResponse runs this sync generator in the threadpool
+        return StreamingResponse(stream_channel_info(channel_name, videos), media_type='application/json')
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+async def download_batch_item(url: str, ydl_opts: dict, batch_slots: asyncio.Semaphore) -> tuple[list[str], str | None]:
+    # Returns the item's files, or no files and an "url: error" line if yt-dlp
+    # failed, so one bad URL doesn't take the rest of the batch down with it
+    async with batch_slots, DOWNLOAD_SLOTS:
+        job = DOWNLOAD_POOL.submit(run_batch, [url], ydl_opts)
+        result = asyncio.wrap_future(job)
+        try:
+            return await asyncio.shield(result), None
+        except yt_dlp.utils.DownloadError as e:
+            return [], f"{url}: {e}"
+        except asyncio.CancelledError:
+            # A job that's already running in a worker can't be interrupted. Hold the
+            # slot until it exits so finish_batch doesn't remove the batch dir while
+            # it's still writing there.
+            if not job.cancel():
+                await asyncio.wait([result])
+                result.exception()  # the batch is abandoned; don't log its outcome as unretrieved
+            raise
+
+def unique_arcname(name: str, used: set[str]) -> str:
+    # Different videos can share a title; number the repeats like "Title (2).mp4"
+    stem, ext = os.path.splitext(name)
+    n = 1
+    while name in used:
+        n += 1
+        name = f"{stem} ({n}){ext}"
+    used.add(name)
+    return name
+
+async def stream_batch_zip(urls: list[str], ydl_opts: dict, batch_dir: Path):
+    # URLs download in parallel (bounded by MAX_BATCH_PARALLEL and DOWNLOAD_SLOTS) and each one is
+    # zipped as soon as it finishes, instead of archiving the whole batch on disk first
+    out = ZipChunkWriter()
+    batch_slots = asyncio.Semaphore(MAX_BATCH_PARALLEL)
+    # Items run at the same time, so each gets its own subfolder; otherwise two
+    # videos with the same title would write to the same .part and output file
+    tasks = [
+        asyncio.create_task(download_batch_item(url, {**ydl_opts, 'outtmpl': str(batch_dir / str(i) / "%(title)s.%(ext)s")}, batch_slots))
+        for i, url in enumerate(urls)
+    ]
+    arcnames, errors = set(), []
+    try:
+        # mp3/mp4 are already compressed, so entries are stored rather than deflated
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for next_done in asyncio.as_completed(tasks):
+                filenames, error = await next_done
+                if error: errors.append(error)
+                for filename in filenames:
+                    zinfo = zipfile.ZipInfo.from_file(filename, arcname=unique_arcname(os.path.basename(filename), arcnames))
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                    with open(filename, 'rb') as src, zf.open(zinfo, 'w') as dst:
+                        while await asyncio.to_thread(copy_chunk, src, dst):
+                            if data := out.drain(): yield data
+                    if data := out.drain(): yield data
+            if errors:
+                # Nothing has been sent yet if every item failed, so that can still be a 500
+                if len(errors) == len(urls): raise yt_dlp.utils.DownloadError("\n".join(errors))
+                # Otherwise list the skipped URLs alongside the files that made it
+                zf.writestr('errors.txt', "\n".join(errors) + "\n")
+        if data := out.drain(): yield data
+    finally:
+        for task in tasks: task.cancel()
+        # No awaits here: on client disconnect Starlette cancels this generator through
+        # an anyio cancel scope that would re-cancel each one, so finish up in a task
+        run_in_background(finish_batch(tasks, batch_dir))
+
+async def finish_batch(tasks: list[asyncio.Task], batch_dir: Path):
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await cleanup_async(batch_dir)
+
 @app.post("/api/download/batch")
-async def download_batch(request: BatchRequest, background_tasks: BackgroundTasks):
-    run_id = str(uuid.uuid4())
-    batch_dir = f"{DOWNLOAD_DIR}/{run_id}"
-    os.makedirs(batch_dir, exist_ok=True)
-    
-    ydl_opts = {
-        'outtmpl': f"{batch_dir}/%(title)s.%(ext)s",
-        'quiet': True,
-        'ffmpeg_location': FFMPEG_PATH, 
-    }
+async def download_batch(request: BatchRequest):
+    # Drop repeated URLs (keeping order) so each video is only downloaded once
+    urls = list(dict.fromkeys(request.urls))
+    if not urls: raise HTTPException(status_code=400, detail="No URLs provided.")
+    if len(urls) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} URLs).")
 
+    run_id = uuid.uuid4().hex[:16]
+    batch_dir = DOWNLOAD_DIR / run_id
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    
+    # stream_batch_zip sets a per-item outtmpl
     if request.type == 'audio':
-        ydl_opts.update({
+        ydl_opts = {
+            **AUDIO_OPTS_BASE,
             'format': f'bestaudio[abr<={request.quality}]/bestaudio/best',
-            'postprocessors': [{'key': 'FFmpegExtractAudio','preferredcodec': 'mp3', 'preferredquality': request.quality}],
-        })
+            'postprocessors': [{**MP3_POSTPROCESSOR, 'preferredquality': request.quality}],
+        }
     else:
-        ydl_opts.update({
+        ydl_opts = {
+            **VIDEO_OPTS_BASE,
             'format': f'bestvideo[height<={request.quality}]+bestaudio/best',
-            'merge_output_format': 'mp4',
-        })
+        }
 
-    def run_batch():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download(request.urls)
-        shutil.make_archive(batch_dir, 'zip', batch_dir)
+    chunks = stream_batch_zip(urls, ydl_opts, batch_dir)
         
     try:
-        await asyncio.to_thread(run_batch)
-        zip_path = f"{batch_dir}.zip"
-        background_tasks.add_task(cleanup_file, batch_dir)
-        background_tasks.add_task(cleanup_file, zip_path)
-        return FileResponse(path=zip_path, filename="Batch_Download.zip", media_type='application/zip')
+        # Wait for the first download here so a batch where every item fails still
+        # gets a 500 instead of a 200 with no videos in it
+        first_chunk = await anext(chunks)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def body():
+        try:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Runs stream_batch_zip's cleanup now rather than whenever it's collected
+            await chunks.aclose()
+
+    return ClosingStreamingResponse(body(), media_type='application/zip', headers={'Content-Disposition': 'attachment; filename="Batch_Download.zip"'})
\ No newline at end of file